@@ -9,33 +9,54 @@ Crypto intraday scanner (CoinGecko + optional CCXT funding check)
 
 import os
 import time
-import math
 import json
+import atexit
+import pickle
+import importlib.util
 import smtplib
 import logging
+import functools
+import threading
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import pandas as pd
 import numpy as np
 
-# optional CCXT import; script will continue if CCXT not available
+# optional CCXT; script will continue if CCXT not available. Importing it is slow, so it is
+# only located here and imported on first use (see load_ccxt)
+CCXT_AVAILABLE = importlib.util.find_spec("ccxt") is not None
+_ccxt = None
+
+# optional orjson for faster parsing of the large CoinGecko payload; falls back to stdlib json
 try:
-    import ccxt
-    CCXT_AVAILABLE = True
+    import orjson
+    ORJSON_AVAILABLE = True
 except Exception:
-    CCXT_AVAILABLE = False
+    ORJSON_AVAILABLE = False
 
 # -----------------------
 # Config (via env / defaults)
 # -----------------------
 COINGECKO_API = "https://api.coingecko.com/api/v3"
+BINANCE_FAPI = "https://fapi.binance.com/fapi/v1"
 RANK_MIN = int(os.getenv("RANK_MIN", "40"))
 RANK_MAX = int(os.getenv("RANK_MAX", "100"))
 TOP_N = int(os.getenv("TOP_N", "250"))  # fetch this many from coinGecko (>= RANK_MAX)
 API_RATE_LIMIT_SECONDS = float(os.getenv("API_RATE_LIMIT_SECONDS", "0.6"))
+MARKETS_TTL = float(os.getenv("MARKETS_TTL", "120"))  # seconds a /coins/markets payload is reused
+MARKETS_CACHE_MAX_AGE = float(os.getenv("MARKETS_CACHE_MAX_AGE", "86400"))  # drop entries older than this
+RANK_IDS_TTL = float(os.getenv("RANK_IDS_TTL", "43200"))  # reuse the rank-range coin ids for 12h, then refetch all
+CACHE_DIR = os.path.expanduser(os.getenv("SCANNER_CACHE_DIR", "~/.cache/scanner"))  # "" disables on-disk caches
+FUNDING_TTL = float(os.getenv("FUNDING_TTL", "3600"))  # Binance funding settles every 8h; 1h is fresh enough
+FUNDING_NEGATIVE_TTL = float(os.getenv("FUNDING_NEGATIVE_TTL", "21600"))  # remember "no perp listing" for 6h
+PERP_LISTING_TTL = float(os.getenv("PERP_LISTING_TTL", "86400"))  # refresh Binance's perp listing daily
+FUNDING_MAX_WORKERS = int(os.getenv("FUNDING_MAX_WORKERS", "20"))  # concurrent funding lookups
 
 SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
 SMTP_PORT = int(os.getenv("SMTP_PORT", "587"))
@@ -49,9 +70,58 @@ MIN_1H_PCT = float(os.getenv("MIN_1H_PCT", "2.0"))     # e.g. at least +2% in 1h
 MIN_24H_PCT = float(os.getenv("MIN_24H_PCT", "3.0"))   # e.g. at least +3% in 24h
 VOLUME_MULTIPLIER = float(os.getenv("VOLUME_MULTIPLIER", "1.4"))  # volume > median*factor
 
+# explicit, narrow dtypes for the /coins/markets columns the scan uses, instead of per-row inference
+MARKET_DTYPES = {
+    "id": "category",
+    "symbol": "category",
+    "market_cap_rank": "Int16",
+    "current_price": "float64",
+    "total_volume": "float64",
+    "price_change_percentage_1h_in_currency": "float32",
+    "price_change_percentage_24h_in_currency": "float32",
+}
+
 # logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s: %(message)s")
 
+# one pooled keep-alive session for all plain HTTP calls; retries 429/5xx with backoff
+_SESSION = requests.Session()
+_SESSION.headers.update({"Accept-Encoding": "gzip"})
+_SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=10,
+    max_retries=Retry(total=3, backoff_factor=0.5, status_forcelist=[429, 500, 502, 503, 504]),
+))
+
+# background I/O that can overlap the CoinGecko download (see warm_funding_sources)
+_IO_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scanner-io")
+
+# single background sender so SMTP latency doesn't hold up the scan; drained at exit
+_EMAIL_POOL = ThreadPoolExecutor(max_workers=1, thread_name_prefix="scanner-email")
+atexit.register(_EMAIL_POOL.shutdown, wait=True)
+
+# (vs_currency, per_page, page, price_change_pct, ids) -> (fetched_at, markets, validators)
+# validators holds the response's ETag / Last-Modified so expired entries can be revalidated (304)
+_markets_cache = {}
+_markets_cache_loaded = False
+MARKETS_CACHE_FILE = "markets_cache.pkl"
+RANK_IDS_FILE = "rank_ids.pkl"
+
+# (ccxt_exchange, symbol) -> (fetched_at, funding_info); guarded by _funding_lock (lookups run in a pool).
+# funding_info None is a negative entry: the exchange has no such market.
+_funding_cache = {}
+_funding_cache_loaded = False
+_funding_cache_dirty = False
+_funding_lock = threading.Lock()
+# (ccxt_exchange, symbol) -> funding_info for every lookup made during the current scan, including
+# transient failures, so a scan never repeats a request; reset by run_scan
+_scan_funding_cache = {}
+FUNDING_CACHE_FILE = "funding_cache.pkl"
+
+# (fetched_at, frozenset of Binance USDT perp ids), see binance_usdt_perps()
+_perp_listing = None
+PERP_LISTING_FILE = "binance_perps.pkl"
+
 # -----------------------
 # Helpers
 # -----------------------
@@ -59,8 +129,73 @@ def rate_limit_sleep():
     if API_RATE_LIMIT_SECONDS > 0:
         time.sleep(API_RATE_LIMIT_SECONDS)
 
-def fetch_coingecko_markets(vs_currency="usd", per_page=250, page=1, price_change_pct="1h,24h"):
-    """Fetch /coins/markets from CoinGecko."""
+def cache_path(name):
+    """Path of an on-disk cache file, or None when disk caching is disabled."""
+    return os.path.join(CACHE_DIR, name) if CACHE_DIR else None
+
+def load_pickle_cache(name, default):
+    """Load a pickled cache from CACHE_DIR; return `default` if missing or unreadable."""
+    path = cache_path(name)
+    if not path or not os.path.exists(path):
+        return default
+    try:
+        with open(path, "rb") as fh:
+            return pickle.load(fh)
+    except Exception as e:
+        logging.debug("Ignoring unreadable cache %s: %s", path, e)
+        return default
+
+def save_pickle_cache(name, obj):
+    """Atomically write a pickled cache into CACHE_DIR (best-effort)."""
+    path = cache_path(name)
+    if not path:
+        return
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            pickle.dump(obj, fh)
+        os.replace(tmp, path)
+    except Exception as e:
+        logging.debug("Could not write cache %s: %s", path, e)
+
+def prune_markets_cache():
+    """Evict markets entries older than MARKETS_CACHE_MAX_AGE (never before MARKETS_TTL).
+
+    Expired entries are kept until then only so their ETag can still be revalidated.
+    """
+    max_age = max(MARKETS_TTL, MARKETS_CACHE_MAX_AGE)
+    now = time.time()
+    for key in [k for k, v in _markets_cache.items() if now - v[0] >= max_age]:
+        del _markets_cache[key]
+
+def _ensure_markets_cache_loaded():
+    global _markets_cache_loaded
+    if not _markets_cache_loaded:
+        _markets_cache.update(load_pickle_cache(MARKETS_CACHE_FILE, {}))
+        prune_markets_cache()
+        _markets_cache_loaded = True
+
+def fresh_cached_markets(vs_currency="usd", per_page=250, page=1, price_change_pct="1h,24h", ids=None):
+    """Return a cached /coins/markets payload younger than MARKETS_TTL without any request, else None."""
+    _ensure_markets_cache_loaded()
+    cached = _markets_cache.get((vs_currency, per_page, page, price_change_pct, ids))
+    if cached is not None and time.time() - cached[0] < MARKETS_TTL:
+        return cached[1]
+    return None
+
+def fetch_coingecko_markets(vs_currency="usd", per_page=250, page=1, price_change_pct="1h,24h", ids=None):
+    """Fetch /coins/markets from CoinGecko, reusing a payload younger than MARKETS_TTL.
+
+    `ids` (comma-separated CoinGecko ids) restricts the response to those coins.
+    """
+    key = (vs_currency, per_page, page, price_change_pct, ids)
+    _ensure_markets_cache_loaded()
+    cached = _markets_cache.get(key)
+    if cached is not None and time.time() - cached[0] < MARKETS_TTL:
+        logging.info("Using cached CoinGecko markets (%.0fs old)", time.time() - cached[0])
+        return cached[1]
+
     url = f"{COINGECKO_API}/coins/markets"
     params = {
         "vs_currency": vs_currency,
@@ -69,36 +204,312 @@ def fetch_coingecko_markets(vs_currency="usd", per_page=250, page=1, price_chang
         "page": page,
         "price_change_percentage": price_change_pct,
     }
-    resp = requests.get(url, params=params, timeout=30)
-    resp.raise_for_status()
+    if ids:
+        params["ids"] = ids
+    # revalidate an expired entry instead of downloading it again if CoinGecko reports no change
+    validators = cached[2] if cached is not None and len(cached) > 2 else {}
+    headers = {}
+    if validators.get("etag"):
+        headers["If-None-Match"] = validators["etag"]
+    if validators.get("last_modified"):
+        headers["If-Modified-Since"] = validators["last_modified"]
+    resp = _SESSION.get(url, params=params, headers=headers, timeout=30)
+    if resp.status_code == 304 and cached is not None:
+        logging.info("CoinGecko markets not modified; reusing cached payload")
+        markets = cached[1]
+        validators = {
+            "etag": resp.headers.get("ETag") or validators.get("etag"),
+            "last_modified": resp.headers.get("Last-Modified") or validators.get("last_modified"),
+        }
+    else:
+        resp.raise_for_status()
+        # parse straight from the response bytes; orjson skips the intermediate str decode
+        markets = orjson.loads(resp.content) if ORJSON_AVAILABLE else resp.json()
+        validators = {"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}
+    _markets_cache[key] = (time.time(), markets, validators)
+    if ids:
+        # only the current rank-slice id list will be requested again; drop entries for older lists
+        for k in [k for k in _markets_cache if len(k) > 4 and k[4] and k != key]:
+            del _markets_cache[k]
+    prune_markets_cache()
+    save_pickle_cache(MARKETS_CACHE_FILE, _markets_cache)
     rate_limit_sleep()
-    return resp.json()
+    return markets
+
+def markets_to_frame(markets):
+    """Build a DataFrame from /coins/markets records with MARKET_DTYPES applied."""
+    df = pd.DataFrame.from_records(markets)
+    for col, dtype in MARKET_DTYPES.items():
+        if col not in df.columns:
+            continue
+        if dtype != "category":
+            df[col] = pd.to_numeric(df[col], errors="coerce")
+        df[col] = df[col].astype(dtype)
+    return df
+
+def load_ccxt():
+    """Import ccxt on first use and return the module, or None if it cannot be imported."""
+    global _ccxt, CCXT_AVAILABLE
+    if _ccxt is None and CCXT_AVAILABLE:
+        try:
+            import ccxt
+            _ccxt = ccxt
+        except Exception as e:
+            logging.warning("ccxt is installed but failed to import; skipping funding checks: %s", e)
+            CCXT_AVAILABLE = False
+    return _ccxt
+
+_exchange_lock = threading.Lock()
+# exchange name -> setup error; a dead exchange is tried once per scan, not once per probe (reset by run_scan)
+_exchange_failures = {}
+
+@functools.lru_cache(maxsize=8)
+def _create_exchange(name):
+    ex = getattr(load_ccxt(), name)()
+    ex.load_markets()
+    return ex
+
+def get_exchange(name):
+    """Return a process-wide ccxt exchange with markets already loaded (created once per name).
+
+    If creating it fails, later calls in the same scan raise immediately instead of retrying.
+    """
+    # serialize creation so concurrent funding lookups don't each build and load their own instance
+    with _exchange_lock:
+        if name in _exchange_failures:
+            raise RuntimeError(f"{name} setup already failed this scan: {_exchange_failures[name]}")
+        try:
+            return _create_exchange(name)
+        except Exception as e:
+            _exchange_failures[name] = e
+            raise
+
+def _funding_entry_fresh(entry, now):
+    ttl = FUNDING_TTL if entry[1] is not None else FUNDING_NEGATIVE_TTL
+    return now - entry[0] < ttl
+
+def _store_funding(key, funding_info):
+    global _funding_cache_dirty
+    with _funding_lock:
+        _funding_cache[key] = (time.time(), funding_info)
+        _funding_cache_dirty = True
+
+def _ensure_funding_cache_loaded():
+    global _funding_cache_loaded
+    with _funding_lock:
+        if not _funding_cache_loaded:
+            _funding_cache.update(load_pickle_cache(FUNDING_CACHE_FILE, {}))
+            _funding_cache_loaded = True
+
+def save_funding_cache():
+    """Persist fresh funding entries (including negatives) so the next cold start can skip them."""
+    with _funding_lock:
+        if not _funding_cache_dirty:
+            return
+        now = time.time()
+        fresh = {k: v for k, v in _funding_cache.items() if _funding_entry_fresh(v, now)}
+    save_pickle_cache(FUNDING_CACHE_FILE, fresh)
+
+atexit.register(save_funding_cache)
+
+def load_rank_slice_ids():
+    """Coin ids seen in the current rank range on a recent full fetch, or None if stale/absent."""
+    cached = load_pickle_cache(RANK_IDS_FILE, None)
+    if not cached:
+        return None
+    fetched_at, rank_range, ids = cached
+    if rank_range != (RANK_MIN, RANK_MAX) or time.time() - fetched_at >= RANK_IDS_TTL or not ids:
+        return None
+    return ids
+
+def save_rank_slice_ids(ids):
+    save_pickle_cache(RANK_IDS_FILE, (time.time(), (RANK_MIN, RANK_MAX), list(ids)))
 
 def try_fetch_funding_rate(ccxt_exchange, symbol):
-    """Try to fetch funding rate via ccxt if available; return None on fail."""
+    """Try to fetch funding rate via ccxt if available; return None on fail.
+
+    Rates are cached per (exchange, symbol) for FUNDING_TTL seconds; symbols the
+    exchange does not list are remembered for FUNDING_NEGATIVE_TTL seconds.
+    Transient errors are only remembered for the rest of the current scan.
+    """
     if not CCXT_AVAILABLE:
         return None
+    _ensure_funding_cache_loaded()
+    key = (ccxt_exchange, symbol)
+    with _funding_lock:
+        if key in _scan_funding_cache:
+            return _scan_funding_cache[key]
+        cached = _funding_cache.get(key)
+    if cached is not None and _funding_entry_fresh(cached, time.time()):
+        return cached[1]
     try:
-        ex = getattr(ccxt, ccxt_exchange)()
-        # many exchanges require symbol as e.g. "BTC/USDT:USDT" or "BTC/USDT"
-        # ccxt has no unified method across all exchanges for funding rates; try safe call
-        if hasattr(ex, "fetch_funding_rate"):
-            return ex.fetch_funding_rate(symbol)
-        # fallback: some exchanges have fetchFundingRate or fetchFundingRates
-        if hasattr(ex, "fetchFundingRate"):
-            return ex.fetchFundingRate(symbol)
-        if hasattr(ex, "fetchFundingRates"):
-            rates = ex.fetchFundingRates([symbol])
-            # find rate for symbol
-            for r in rates:
-                if r.get("symbol") == symbol:
-                    return r
+        ccxt = load_ccxt()
+        if ccxt is None:
             return None
+        fr = _fetch_funding_rate_uncached(ccxt_exchange, symbol) or None
+    except Exception as e:
+        if _ccxt is None or not isinstance(e, _ccxt.BadSymbol):
+            logging.debug("Funding fetch error: %s", e)
+            with _funding_lock:
+                _scan_funding_cache[key] = None
+            return None
+        fr = None
+    _store_funding(key, fr)
+    with _funding_lock:
+        _scan_funding_cache[key] = fr
+    return fr
+
+def _fetch_funding_rate_uncached(ccxt_exchange, symbol):
+    ex = get_exchange(ccxt_exchange)
+    # many exchanges require symbol as e.g. "BTC/USDT:USDT" or "BTC/USDT"
+    # ccxt has no unified method across all exchanges for funding rates; try safe call
+    if hasattr(ex, "fetch_funding_rate"):
+        return ex.fetch_funding_rate(symbol)
+    # fallback: some exchanges have fetchFundingRate or fetchFundingRates
+    if hasattr(ex, "fetchFundingRate"):
+        return ex.fetchFundingRate(symbol)
+    if hasattr(ex, "fetchFundingRates"):
+        rates = ex.fetchFundingRates([symbol])
+        # find rate for symbol
+        for r in rates:
+            if r.get("symbol") == symbol:
+                return r
+    return None
+
+def binance_usdt_perps():
+    """Frozenset of trading Binance USDT-margined perpetual ids (e.g. "BTCUSDT"), or None if unavailable.
+
+    Read from /fapi/v1/exchangeInfo at most once per PERP_LISTING_TTL (cached in memory and on disk).
+    """
+    global _perp_listing
+    if _perp_listing is None:
+        _perp_listing = load_pickle_cache(PERP_LISTING_FILE, None)
+    if _perp_listing is not None and time.time() - _perp_listing[0] < PERP_LISTING_TTL:
+        return _perp_listing[1]
+    try:
+        resp = _SESSION.get(f"{BINANCE_FAPI}/exchangeInfo", timeout=30)
+        resp.raise_for_status()
+        listed = frozenset(
+            s["symbol"] for s in resp.json().get("symbols", [])
+            if s.get("contractType") == "PERPETUAL" and s.get("quoteAsset") == "USDT" and s.get("status") == "TRADING"
+        )
     except Exception as e:
-        logging.debug("Funding fetch error: %s", e)
+        logging.debug("Binance exchangeInfo fetch failed: %s", e)
         return None
+    _perp_listing = (time.time(), listed)
+    save_pickle_cache(PERP_LISTING_FILE, _perp_listing)
+    return listed
+
+def fetch_funding_for_symbol(symbol, listed=None):
+    """Best-effort funding lookup for a coin symbol on Binance; return None if unavailable.
+
+    With `listed` (see binance_usdt_perps) only the USDT perp is probed, and only if it exists.
+    """
+    if not CCXT_AVAILABLE or not symbol:
+        return None
+    if listed is not None:
+        try_symbols = [f"{symbol}/USDT:USDT"] if f"{symbol}USDT" in listed else []
+    else:
+        # try commonly used perpetual symbol for Binance: e.g. "BTC/USDT:USDT" or "BTC/USDT"
+        try_symbols = [f"{symbol}/USDT", f"{symbol}/USD", f"{symbol}/USDT:USDT"]
+    for s in try_symbols:
+        fr = try_fetch_funding_rate("binance", s)
+        if fr:
+            return fr
+    return None
+
+def fetch_funding_many(symbols, ccxt_exchange="binance"):
+    """Look up USDT-margined perp funding for many coin symbols; returns a list aligned with `symbols`.
+
+    Coins missing from Binance's perp listing are skipped without any request.
+    The rest use one bulk fetch_funding_rates() call (Binance returns every perp
+    from a single endpoint) unless they are all cached already. Falls back to
+    concurrent per-symbol probes if the bulk call fails, but not if the exchange
+    itself cannot be set up.
+    """
+    symbols = list(symbols)
+    results = [None] * len(symbols)
+    if not CCXT_AVAILABLE or not symbols:
+        return results
+    listed = binance_usdt_perps() if ccxt_exchange == "binance" else None
+    todo = [i for i, s in enumerate(symbols) if s and (listed is None or f"{s}USDT" in listed)]
+    if not todo or load_ccxt() is None:
+        return results
+
+    _ensure_funding_cache_loaded()
+    keys = {i: (ccxt_exchange, f"{symbols[i]}/USDT:USDT") for i in todo}
+    now = time.time()
+    with _funding_lock:
+        cached = {i: _funding_cache.get(k) for i, k in keys.items()}
+    if all(c is not None and _funding_entry_fresh(c, now) for c in cached.values()):
+        for i, c in cached.items():
+            results[i] = c[1]
+        return results
+
+    try:
+        ex = get_exchange(ccxt_exchange)
+    except Exception as e:
+        # per-symbol probes need the same exchange, so there is nothing left to try this scan
+        logging.warning("Could not set up %s for funding lookups: %s", ccxt_exchange, e)
+        return results
+    try:
+        all_rates = ex.fetch_funding_rates()
+    except Exception as e:
+        logging.debug("Bulk funding fetch failed, probing per symbol: %s", e)
+        # lookups are network-bound, so overlap the round-trips instead of paying them serially
+        with ThreadPoolExecutor(max_workers=max(1, min(FUNDING_MAX_WORKERS, len(todo)))) as pool:
+            found = pool.map(lambda i: fetch_funding_for_symbol(symbols[i], listed), todo)
+            for i, fr in zip(todo, found):
+                results[i] = fr
+        return results
+
+    if isinstance(all_rates, dict):
+        all_rates = all_rates.values()
+    funding_by_symbol = {r["symbol"]: r for r in all_rates if r.get("symbol")}
+    for symbol, fr in funding_by_symbol.items():
+        _store_funding((ccxt_exchange, symbol), fr)
+    for i, key in keys.items():
+        results[i] = funding_by_symbol.get(key[1])
+        if results[i] is None:
+            _store_funding(key, None)
+    return results
+
+def warm_funding_sources(ccxt_exchange="binance"):
+    """Load the cheap inputs of funding lookups (funding cache, perp listing) ahead of time.
+
+    Independent of the CoinGecko data, so run_scan runs it in the background while markets download.
+    The ccxt import and exchange setup are left to fetch_funding_many, so scans without
+    candidates never pay for them.
+    """
+    if not CCXT_AVAILABLE:
+        return
+    try:
+        _ensure_funding_cache_loaded()
+        if ccxt_exchange == "binance":
+            binance_usdt_perps()
+    except Exception as e:
+        logging.debug("Funding warm-up failed: %s", e)
+
+def format_funding(fr):
+    """Render a funding lookup result for the report (rate if present, else truncated JSON)."""
+    if isinstance(fr, dict):
+        # format commonly available funding info
+        fr_rate = fr.get("fundingRate") or fr.get("rate") or fr.get("funding_rate")
+        if fr_rate is not None:
+            return f"{fr_rate}"
+        return json.dumps(fr)[:200]
+    if fr:
+        return str(fr)
+    return ""
 
 def send_email(subject, html_body):
+    """Queue an email on the background sender; returns a Future resolving to (ok, info).
+
+    The SMTP dialog runs off the scan's critical path; pending sends finish before exit.
+    """
+    return _EMAIL_POOL.submit(_send_email_sync, subject, html_body)
+
+def _send_email_sync(subject, html_body):
     """Send an email using SMTP. Requires SMTP_USER and SMTP_PASSWORD to be set."""
     if not SMTP_USER or not SMTP_PASSWORD or not EMAIL_RECIPIENT:
         logging.warning("SMTP or recipient not configured. Skipping email send.")
@@ -127,30 +538,55 @@ def send_email(subject, html_body):
         logging.exception("Failed to send email")
         return False, str(e)
 
+def log_report_email(future):
+    """Done-callback for the report email: log whether it went out."""
+    ok, info = future.result()
+    if not ok:
+        logging.error("Email failed: %s", info)
+    else:
+        logging.info("Report emailed successfully.")
+
 # -----------------------
 # Main scanning logic
 # -----------------------
 def run_scan():
     try:
         logging.info("Starting scan: rank range %d-%d", RANK_MIN, RANK_MAX)
-        markets = fetch_coingecko_markets(per_page=TOP_N, price_change_pct="1h,24h")
+        _scan_funding_cache.clear()
+        _exchange_failures.clear()
+        funding_warmup = _IO_POOL.submit(warm_funding_sources)
+        # a full payload younger than MARKETS_TTL (back-to-back runs) is reused without any request;
+        # otherwise, after a full fetch the rank range's coin ids are remembered, so later runs
+        # only download those coins; a full fetch refreshes them every RANK_IDS_TTL
+        markets = fresh_cached_markets(per_page=TOP_N, price_change_pct="1h,24h")
+        rank_ids = load_rank_slice_ids() if markets is None else None
+        if rank_ids:
+            try:
+                markets = fetch_coingecko_markets(per_page=len(rank_ids), price_change_pct="1h,24h",
+                                                  ids=",".join(rank_ids))
+            except requests.RequestException as e:
+                logging.warning("CoinGecko ids= fetch failed, falling back to full fetch: %s", e)
+        if not markets:
+            rank_ids = None
+            markets = fetch_coingecko_markets(per_page=TOP_N, price_change_pct="1h,24h")
         if not isinstance(markets, list) or len(markets) == 0:
             logging.error("No market data from CoinGecko")
             return
 
-        # Convert to DataFrame for easier computations
-        df = pd.DataFrame(markets)
-        # Ensure rank and required columns exist
-        if "market_cap_rank" not in df.columns:
+        # Ensure rank exists
+        if not any("market_cap_rank" in m for m in markets):
             logging.error("CoinGecko data missing market_cap_rank")
             return
 
-        # Filter by rank
-        mask = df["market_cap_rank"].between(RANK_MIN, RANK_MAX)
-        sel = df[mask].copy()
-        if sel.empty:
+        # Filter by rank on the raw records, then convert only the kept rows to a DataFrame
+        markets = [m for m in markets
+                   if m.get("market_cap_rank") is not None and RANK_MIN <= m["market_cap_rank"] <= RANK_MAX]
+        if not markets:
             logging.info("No coins in the requested rank range (%d - %d).", RANK_MIN, RANK_MAX)
             return
+        sel = markets_to_frame(markets)
+        if rank_ids is None and "id" in sel.columns:
+            save_rank_slice_ids(sel["id"].dropna().astype(str))
 
         # Clean up some columns and compute signals
         # CoinGecko may provide price_change_percentage_1h_in_currency and price_change_percentage_24h_in_currency
@@ -161,60 +597,53 @@ def run_scan():
 
         sel["price_change_24h"] = sel.get("price_change_percentage_24h_in_currency", sel.get("price_change_24h", np.nan))
 
-        # volume handling
+        # volume handling; the median ignores missing volumes, so take it before they are zero-filled
         sel["total_volume"] = sel.get("total_volume", 0)
-        median_vol = sel["total_volume"].median() if not sel["total_volume"].isna().all() else 0
+        vol_arr = pd.to_numeric(sel["total_volume"], errors="coerce").to_numpy(dtype=np.float64, na_value=np.nan)
+        median_vol = float(np.nanmedian(vol_arr)) if vol_arr.size and not np.isnan(vol_arr).all() else 0.0
 
-        # build candidate list
-        candidates = []
-        for _, row in sel.iterrows():
-            try:
-                coin_id = row.get("id")
-                symbol = row.get("symbol", "").upper()
-                name = row.get("name", coin_id)
-                rank = int(row.get("market_cap_rank", -1))
-                price = row.get("current_price", float("nan"))
-                vol = float(row.get("total_volume") or 0)
-                change_1h = float(row.get("price_change_1h") or 0)
-                change_24h = float(row.get("price_change_24h") or 0)
-
-                # Basic signal: 1h move above threshold AND 24h confirms (same direction) AND volume above median*factor
-                signal = False
-                reasons = []
-                if change_1h >= MIN_1H_PCT:
-                    reasons.append(f"1h {change_1h:.2f}% ≥ {MIN_1H_PCT}%")
-                if change_24h >= MIN_24H_PCT:
-                    reasons.append(f"24h {change_24h:.2f}% ≥ {MIN_24H_PCT}%")
-                if median_vol > 0 and vol >= median_vol * VOLUME_MULTIPLIER:
-                    reasons.append(f"vol {vol:.0f} ≥ median*{VOLUME_MULTIPLIER:.2f}")
-                # require at least two of the three conditions to avoid too many false positives
-                if len(reasons) >= 2:
-                    signal = True
-
-                funding_info = None
-                # try optional funding rate: map coin to a futures symbol (best-effort)
-                if CCXT_AVAILABLE:
-                    # try commonly used perpetual symbol for Binance: e.g. "BTC/USDT:USDT" or "BTC/USDT"
-                    try_symbols = []
-                    if symbol:
-                        try_symbols = [f"{symbol}/USDT", f"{symbol}/USD", f"{symbol}/USDT:USDT"]
-                    funding_info = None
-                    for s in try_symbols:
-                        fr = try_fetch_funding_rate("binance", s)
-                        if fr:
-                            funding_info = fr
-                            break
-
-                if signal:
-                    candidates.append({
-                        "id": coin_id, "name": name, "symbol": symbol, "rank": rank,
-                        "price": price, "vol": vol,
-                        "1h": change_1h, "24h": change_24h,
-                        "reasons": reasons, "funding": funding_info
-                    })
-            except Exception:
-                logging.exception("Error processing coin row")
-                continue
+        # coerce the numeric fields once, column-wise; missing signal inputs count as 0 (no signal)
+        for col in ("total_volume", "price_change_1h", "price_change_24h"):
+            sel[col] = pd.to_numeric(sel[col], errors="coerce").fillna(0.0)
+        sel["current_price"] = pd.to_numeric(sel.get("current_price", np.nan), errors="coerce")
+        vol_arr = sel["total_volume"].to_numpy(dtype=np.float64)
+
+        # Basic signal: 1h move above threshold, 24h confirms (same direction), volume above median*factor.
+        # Require at least two of the three conditions to avoid too many false positives.
+        m1 = sel["price_change_1h"].to_numpy() >= MIN_1H_PCT
+        m24 = sel["price_change_24h"].to_numpy() >= MIN_24H_PCT
+        mv = vol_arr >= median_vol * VOLUME_MULTIPLIER if median_vol > 0 else np.zeros(len(sel), dtype=bool)
+        signal = (m1.astype(np.int8) + m24 + mv) >= 2
+        if not signal.any():
+            logging.info("No candidates found this run.")
+            return
+
+        cand = sel.loc[signal, ["id", "name", "symbol", "market_cap_rank", "current_price",
+                                "total_volume", "price_change_1h", "price_change_24h"]]
+        m1, m24, mv = m1[signal], m24[signal], mv[signal]
+
+        # build candidate list (reasons are only formatted for the surviving rows)
+        r1 = np.where(m1, "1h " + cand["price_change_1h"].map("{:.2f}".format) + f"% ≥ {MIN_1H_PCT}%", "")
+        r24 = np.where(m24, "24h " + cand["price_change_24h"].map("{:.2f}".format) + f"% ≥ {MIN_24H_PCT}%", "")
+        rv = np.where(mv, "vol " + cand["total_volume"].map("{:.0f}".format) + f" ≥ median*{VOLUME_MULTIPLIER:.2f}", "")
+        reasons = ["; ".join(r for r in parts if r) for parts in zip(r1, r24, rv)]
+
+        symbols = cand["symbol"].astype("string").fillna("").str.upper()
+        # only reached with candidates, so scans without any never block on the warm-up
+        funding_warmup.result()
+        funding = fetch_funding_many(symbols)
+        candidates = [
+            {
+                "id": coin_id, "name": name if isinstance(name, str) else coin_id, "symbol": symbol,
+                "rank": int(rank), "price": price, "vol": vol,
+                "1h": change_1h, "24h": change_24h,
+                "reasons": reason, "funding": funding_info,
+            }
+            for coin_id, name, symbol, rank, price, vol, change_1h, change_24h, reason, funding_info in zip(
+                cand["id"], cand["name"], symbols, cand["market_cap_rank"], cand["current_price"],
+                cand["total_volume"], cand["price_change_1h"], cand["price_change_24h"], reasons, funding,
+            )
+        ]
 
         # Compose result
         if not candidates:
@@ -224,39 +653,31 @@ def run_scan():
         # Create simple HTML report
         html = "<h2>Crypto Scanner — Candidates</h2>"
         html += f"<p>Rank range: {RANK_MIN}-{RANK_MAX}. Found {len(candidates)} candidates.</p>"
-        html += "<table border='1' cellpadding='6' cellspacing='0'>"
-        html += "<tr><th>Rank</th><th>Name (symbol)</th><th>Price</th><th>1h%</th><th>24h%</th><th>Volume</th><th>Reasons</th><th>Funding (if any)</th></tr>"
-        for c in sorted(candidates, key=lambda x: x["rank"]):
-            fr = c["funding"]
-            fr_str = ""
-            if isinstance(fr, dict):
-                # format commonly available funding info
-                fr_rate = fr.get("fundingRate") or fr.get("rate") or fr.get("funding_rate")
-                fr_time = fr.get("timestamp")
-                if fr_rate is not None:
-                    fr_str = f"{fr_rate}"
-                else:
-                    fr_str = json.dumps(fr)[:200]
-            elif fr:
-                fr_str = str(fr)
-            html += ("<tr>"
-                     f"<td>{c['rank']}</td>"
-                     f"<td>{c['name']} ({c['symbol']})</td>"
-                     f"<td>{c['price']}</td>"
-                     f"<td>{c['1h']:.2f}%</td>"
-                     f"<td>{c['24h']:.2f}%</td>"
-                     f"<td>{int(c['vol']):,}</td>"
-                     f"<td>{'; '.join(c['reasons'])}</td>"
-                     f"<td>{fr_str}</td>"
-                     "</tr>")
-        html += "</table>"
+        cand_df = pd.DataFrame(candidates).sort_values("rank", kind="stable")
+        report = pd.DataFrame({
+            "Rank": cand_df["rank"],
+            "Name (symbol)": cand_df["name"].astype(str) + " (" + cand_df["symbol"] + ")",
+            "Price": cand_df["price"],
+            "1h%": cand_df["1h"],
+            "24h%": cand_df["24h"],
+            "Volume": cand_df["vol"],
+            "Reasons": cand_df["reasons"],
+            "Funding (if any)": cand_df["funding"].map(format_funding),
+        })
+        formatters = {
+            "Price": str,
+            "1h%": "{:.2f}%".format,
+            "24h%": "{:.2f}%".format,
+            "Volume": lambda v: f"{int(v):,}",
+        }
+        # pandas' own table tag; the old cellpadding/cellspacing come from a class-scoped style instead
+        html += ("<style>table.scanner { border-collapse: collapse; } "
+                 "table.scanner th, table.scanner td { padding: 6px; }</style>")
+        html += report.to_html(index=False, escape=False, border=1, classes="scanner", justify="center",
+                               formatters=formatters)
 
         subject = f"[Scanner] {len(candidates)} candidate(s) found"
-        ok, info = send_email(subject, html)
-        if not ok:
-            logging.error("Email failed: %s", info)
-        else:
-            logging.info("Report emailed successfully.")
+        send_email(subject, html).add_done_callback(log_report_email)
     except Exception as e:
         logging.exception("Scan aborted due to exception")
         # send failure email (best effort)